@@ -8,31 +8,56 @@
 
 
 import argparse
+import functools
 import gitlab
-import plotly.express as px
+import numpy as np
+import sys
+import plotly.graph_objects as go
+from concurrent.futures import ThreadPoolExecutor
+from requests import Session
+from requests.adapters import HTTPAdapter
 from gitlab_common import pretty_duration
 from datetime import datetime, timedelta
+from itertools import chain, islice
 from gitlab_common import read_token, GITLAB_URL, get_gitlab_pipeline_from_url
 
+PHASES = ("Waiting dependencies", "Queued", "Running")
+
+# GitLab's maximum page size
+JOBS_PER_PAGE = 100
+
+# When summarizing, pipelines with more jobs than this get a single bar per
+# stage and phase
+MAX_GANTT_JOBS = 200
+
+
+def parse_timestamp(timestamp):
+    # GitLab timestamps end in "Z", which fromisoformat only parses since 3.11
+    if sys.version_info < (3, 11) and timestamp.endswith("Z"):
+        timestamp = timestamp[:-1] + "+00:00"
+    return datetime.fromisoformat(timestamp)
 
-def calculate_queued_at(job):
-    # we can have queued_duration without started_at when a job is canceled
-    if not job.queued_duration or not job.started_at:
-        return None
-    started_at = job.started_at.replace("Z", "+00:00")
-    return datetime.fromisoformat(started_at) - timedelta(seconds=job.queued_duration)
 
+def parse_timestamps(timestamps):
+    # numpy parses ISO 8601 natively but warns about timezone designators,
+    # GitLab timestamps are always UTC so just drop the trailing "Z"
+    return np.array(
+        [ts[:-1] if ts and ts.endswith("Z") else ts for ts in timestamps],
+        dtype="datetime64[ns]",
+    )
+
+
+def calculate_queued_at(jobs, started_at):
+    # we can have queued_duration without started_at when a job is canceled
+    queued_duration = np.array(
+        [job.queued_duration or np.nan for job in jobs], dtype=float
+    )
+    return started_at - (queued_duration * 1e9).astype("timedelta64[ns]")
 
-def calculate_time_difference(time1, time2):
-    if not time1 or not time2:
-        return None
-    if type(time1) is str:
-        time1 = datetime.fromisoformat(time1.replace("Z", "+00:00"))
-    if type(time2) is str:
-        time2 = datetime.fromisoformat(time2.replace("Z", "+00:00"))
 
-    diff = time2 - time1
-    return pretty_duration(diff.seconds)
+def calculate_time_differences(start, finish):
+    seconds = (finish - start) / np.timedelta64(1, "s")
+    return [None if np.isnan(s) else pretty_duration(int(s)) for s in seconds]
 
 
 def create_task_name(job):
@@ -40,51 +65,100 @@ def create_task_name(job):
     return f"{job.name}\t(<span style='color: {status_color}'>{job.status}</span>,<a href='{job.web_url}'>{job.id}</a>)"
 
 
-def add_gantt_bar(job, tasks):
-    queued_at = calculate_queued_at(job)
-    task_name = create_task_name(job)
-
-    tasks.append(
-        {
-            "Job": task_name,
-            "Start": job.created_at,
-            "Finish": queued_at,
-            "Duration": calculate_time_difference(job.created_at, queued_at),
-            "Phase": "Waiting dependencies",
-        }
+def add_gantt_bar(fig, phase, task_names, start, finish, durations):
+    fig.add_trace(
+        go.Bar(
+            name=phase,
+            base=start,
+            x=(finish - start) / np.timedelta64(1, "ms"),
+            y=task_names,
+            customdata=durations,
+            orientation="h",
+            hovertemplate=f"Phase={phase}<br>Start=%{{base}}<br>Finish=%{{x}}<br>"
+            "Job=%{y}<br>Duration=%{customdata}<extra></extra>",
+        )
     )
-    tasks.append(
-        {
-            "Job": task_name,
-            "Start": queued_at,
-            "Finish": job.started_at,
-            "Duration": calculate_time_difference(queued_at, job.started_at),
-            "Phase": "Queued",
-        }
+
+
+def aggregate_by_stage(jobs, starts, finishes):
+    """Merge the jobs of each stage, spanning each phase from its earliest
+    start to its latest finish"""
+    stages = np.array([job.stage for job in jobs])
+    masks = {stage: stages == stage for stage in dict.fromkeys(stages)}
+
+    def span(timestamps, reduce):
+        spans = []
+        for mask in masks.values():
+            valid = timestamps[mask]
+            valid = valid[~np.isnat(valid)]
+            spans.append(reduce(valid) if valid.size else np.datetime64("NaT"))
+        return np.array(spans, dtype="datetime64[ns]")
+
+    task_names = [
+        f"{stage}\t({np.count_nonzero(mask)} jobs)" for stage, mask in masks.items()
+    ]
+    return (
+        task_names,
+        [span(start, np.min) for start in starts],
+        [span(finish, np.max) for finish in finishes],
     )
-    tasks.append(
-        {
-            "Job": task_name,
-            "Start": job.started_at,
-            "Finish": job.finished_at,
-            "Duration": calculate_time_difference(job.started_at, job.finished_at),
-            "Phase": "Running",
-        }
+
+
+def list_pipeline_jobs(pipeline):
+    """List all the jobs of a pipeline, fetching the pages concurrently"""
+    jobs = pipeline.jobs.list(
+        per_page=JOBS_PER_PAGE, include_retried=True, as_list=False
     )
+    # GitLab drops the pagination headers past 10k records, in that case just
+    # walk through the pages one after the other
+    total_pages = jobs.total_pages
+    if not total_pages or total_pages == 1:
+        return list(jobs)
+
+    first_page = list(islice(jobs, JOBS_PER_PAGE))
+
+    def fetch_page(page):
+        return pipeline.jobs.list(
+            per_page=JOBS_PER_PAGE, page=page, include_retried=True
+        )
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        pages = executor.map(fetch_page, range(2, total_pages + 1))
+        return first_page + list(chain.from_iterable(pages))
 
 
-def generate_gantt_chart(pipeline):
+def generate_gantt_chart(pipeline, summarize=False):
     if pipeline.yaml_errors:
         raise ValueError("Pipeline YAML errors detected")
 
-    # Convert the data into a list of dictionaries for plotly
-    tasks = []
+    jobs = list_pipeline_jobs(pipeline)
 
-    for job in pipeline.jobs.list(all=True, include_retried=True):
-        add_gantt_bar(job, tasks)
+    # Parse all the timestamps at once instead of job by job
+    started_at = parse_timestamps([job.started_at for job in jobs])
+    timestamps = (
+        parse_timestamps([job.created_at for job in jobs]),
+        calculate_queued_at(jobs, started_at),
+        started_at,
+        parse_timestamps([job.finished_at for job in jobs]),
+    )
+    starts, finishes = timestamps[:-1], timestamps[1:]
+
+    # Large pipelines make plotly unresponsive, so show stages instead of jobs
+    if not summarize or len(jobs) <= MAX_GANTT_JOBS:
+        task_names = [create_task_name(job) for job in jobs]
+    else:
+        task_names, starts, finishes = aggregate_by_stage(jobs, starts, finishes)
 
     # Make it easier to see retried jobs
-    tasks.sort(key=lambda x: x["Job"])
+    order = np.argsort(task_names, kind="stable")
+    task_names = [task_names[i] for i in order]
+    starts = [start[order] for start in starts]
+    finishes = [finish[order] for finish in finishes]
+
+    durations = [
+        calculate_time_differences(start, finish)
+        for start, finish in zip(starts, finishes)
+    ]
 
     title = f"Gantt chart of jobs in pipeline <a href='{pipeline.web_url}'>{pipeline.web_url}</a>."
     title += (
@@ -93,22 +167,24 @@ def generate_gantt_chart(pipeline):
         else ""
     )
 
-    # Create a Gantt chart
-    fig = px.timeline(
-        tasks,
-        x_start="Start",
-        x_end="Finish",
-        y="Job",
-        color="Phase",
-        title=title,
-        hover_data=["Duration"],
-    )
+    # Create a Gantt chart, with one horizontal bar trace per phase
+    fig = go.Figure()
+    for phase, start, finish, duration in zip(PHASES, starts, finishes, durations):
+        add_gantt_bar(fig, phase, task_names, start, finish, duration)
 
     # Calculate the height dynamically
-    fig.update_layout(height=len(tasks) * 10, yaxis_tickfont_size=14)
+    fig.update_layout(
+        title=title,
+        barmode="overlay",
+        xaxis_type="date",
+        yaxis_title="Job",
+        legend_title="Phase",
+        height=len(PHASES) * len(task_names) * 10,
+        yaxis_tickfont_size=14,
+    )
 
     # Add a deadline line to the chart
-    created_at = datetime.fromisoformat(pipeline.created_at.replace("Z", "+00:00"))
+    created_at = parse_timestamp(pipeline.created_at)
     timeout_at = created_at + timedelta(hours=1)
     fig.add_vrect(
         x0=timeout_at,
@@ -125,6 +201,29 @@ def generate_gantt_chart(pipeline):
     return fig
 
 
+@functools.cache
+def get_gitlab_client(token):
+    """Create a GitLab client once, with a connection pool large enough for
+    the concurrent page fetches"""
+    session = Session()
+    session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16))
+    return gitlab.Gitlab(
+        url=GITLAB_URL,
+        private_token=token,
+        retry_transient_errors=True,
+        session=session,
+    )
+
+
+def generate_from_urls(pipeline_urls, token=None, summarize=False):
+    """Generate the Gantt charts of several pipelines, sharing a single GitLab
+    client between them"""
+    gl = get_gitlab_client(read_token(token))
+    for pipeline_url in pipeline_urls:
+        pipeline, _ = get_gitlab_pipeline_from_url(gl, pipeline_url)
+        yield pipeline_url, generate_gantt_chart(pipeline, summarize)
+
+
 def parse_args() -> None:
     parser = argparse.ArgumentParser(
         description="Generate the Gantt chart from a given pipeline."
@@ -141,22 +240,24 @@ def parse_args() -> None:
         metavar="token",
         help="force GitLab token, otherwise it's read from ~/.config/gitlab-token",
     )
+    parser.add_argument(
+        "--summarize",
+        action="store_true",
+        help=f"show one bar per stage when the pipeline has more than {MAX_GANTT_JOBS} jobs",
+    )
     return parser.parse_args()
 
 
-if __name__ == "__main__":
-    args = parse_args()
-
-    token = read_token(args.token)
+def run(args):
+    for _, fig in generate_from_urls([args.pipeline_url], args.token, args.summarize):
+        if args.output and "htm" in args.output:
+            fig.write_html(args.output)
+        elif args.output:
+            fig.update_layout(width=1000)
+            fig.write_image(args.output)
+        else:
+            fig.show()
 
-    gl = gitlab.Gitlab(url=GITLAB_URL, private_token=token, retry_transient_errors=True)
 
-    pipeline, _ = get_gitlab_pipeline_from_url(gl, args.pipeline_url)
-    fig = generate_gantt_chart(pipeline)
-    if args.output and "htm" in args.output:
-        fig.write_html(args.output)
-    elif args.output:
-        fig.update_layout(width=1000)
-        fig.write_image(args.output)
-    else:
-        fig.show()
+if __name__ == "__main__":
+    run(parse_args())
@@ -18,17 +18,22 @@ def parse_opcode(env, sig, signode):
     return opcode
 
 
+# Maps the API prefix of an extension name to its registry URL
+EXT_URLS = {
+    'VK': lambda ext, parts: f'https://registry.khronos.org/vulkan/specs/1.3-extensions/man/html/{ext}.html',
+    'GL': lambda ext, parts: f'https://registry.khronos.org/OpenGL/extensions/{parts[1]}/{parts[1]}_{parts[2]}.txt',
+}
+
 def ext_role(name, rawtext, text, lineno, inliner, options={}, content=[]):
     text = utils.unescape(text)
-    has_explicit_title, title, ext = split_explicit_title(text)
+    _, title, ext = split_explicit_title(text)
 
     parts = ext.split('_', 2)
-    if parts[0] == 'VK':
-        full_url = f'https://registry.khronos.org/vulkan/specs/1.3-extensions/man/html/{ext}.html'
-    elif parts[0] == 'GL':
-        full_url = f'https://registry.khronos.org/OpenGL/extensions/{parts[1]}/{parts[1]}_{parts[2]}.txt'
-    else:
-        raise Exception(f'Unexpected API: {parts[0]}')
+    try:
+        ext_url = EXT_URLS[parts[0]]
+    except KeyError:
+        raise Exception(f'Unexpected API: {parts[0]}') from None
+    full_url = ext_url(ext, parts)
 
     pnode = nodes.reference(title, title, internal=False, refuri=full_url)
     return [pnode], []
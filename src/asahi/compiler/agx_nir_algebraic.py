@@ -4,6 +4,7 @@
 # SPDX-License-Identifier: MIT
 
 import argparse
+import itertools
 import sys
 import math
 
@@ -13,15 +14,12 @@ c = 'c'
 d = 'd'
 e = 'e'
 
-lower_sm5_shift = []
-
 # Our shifts differ from SM5 for the upper bits. Mask to match the NIR
 # behaviour. Because this happens as a late lowering, NIR won't optimize the
 # masking back out (that happens in the main nir_opt_algebraic).
-for s in [8, 16, 32, 64]:
-    for shift in ["ishl", "ishr", "ushr"]:
-        lower_sm5_shift += [((shift, f'a@{s}', b),
-                             (shift, a, ('iand', b, s - 1)))]
+lower_sm5_shift = [((shift, f'a@{s}', b), (shift, a, ('iand', b, s - 1)))
+                   for s, shift in itertools.product([8, 16, 32, 64],
+                                                     ["ishl", "ishr", "ushr"])]
 
 lower_pack = [
     (('pack_half_2x16_split', a, b),
@@ -4,9 +4,8 @@
 import sys
 
 from builtin_types import BUILTIN_TYPES
-from mako.template import Template
 
-template = """\
+header = """\
 /*
  * Copyright 2023 Intel Corporation
  * SPDX-License-Identifier: MIT
@@ -17,27 +16,7 @@ template = """\
 #include "glsl_types.h"
 #include "util/glheader.h"
 
-const char glsl_type_builtin_names[] =
-%for n in NAME_ARRAY:
-   "${n}"
-%endfor
-;
-
-%for t in BUILTIN_TYPES:
-const struct glsl_type glsl_type_builtin_${t["name"]} = {
-   %for k, v in t.items():
-       %if v is None or k == "name":
-          <% continue %>
-       %elif k == "name_id":
-          .name_id = ${v},
-          .has_builtin_name = 1,
-       %else:
-          .${k} = ${v},
-       %endif
-   %endfor
-};
-
-%endfor"""
+"""
 
 if len(sys.argv) < 2:
     print('Missing output argument', file=sys.stderr)
@@ -56,5 +35,23 @@ for t in BUILTIN_TYPES:
     t["name_id"] = id
     id += len(name) + 1
 
+# The output is simple enough to be emitted directly, without going through
+# a template engine.
+parts = [header, "const char glsl_type_builtin_names[] =\n"]
+parts += [f'   "{n}"\n' for n in NAME_ARRAY]
+parts.append(";\n\n")
+
+for t in BUILTIN_TYPES:
+    parts.append(f'const struct glsl_type glsl_type_builtin_{t["name"]} = {{\n')
+    for k, v in t.items():
+        if v is None or k == "name":
+            continue
+        elif k == "name_id":
+            parts.append(f"   .name_id = {v},\n")
+            parts.append("   .has_builtin_name = 1,\n")
+        else:
+            parts.append(f"   .{k} = {v},\n")
+    parts.append("};\n\n")
+
 with open(output, 'w', encoding='utf-8') as f:
-    f.write(Template(template).render(BUILTIN_TYPES=BUILTIN_TYPES, NAME_ARRAY=NAME_ARRAY))
+    f.write("".join(parts))
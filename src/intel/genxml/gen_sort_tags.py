@@ -5,12 +5,27 @@
 from __future__ import annotations
 import argparse
 import copy
+import functools
 import intel_genxml
+import multiprocessing
 import pathlib
 import xml.etree.ElementTree as et
 import typing
 
 
+def process_file(filename: pathlib.Path, validate: bool) -> pathlib.Path:
+    genxml = intel_genxml.GenXml(filename)
+
+    if validate:
+        assert genxml.is_equivalent_xml(genxml.sorted_copy()), \
+            f'{filename} is invalid, run gen_sort_tags.py and commit that'
+    else:
+        genxml.sort()
+        genxml.write_file()
+
+    return filename
+
+
 def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument('files', nargs='*',
@@ -20,18 +35,23 @@ def main() -> None:
     parser.add_argument('--quiet', action='store_true')
     args: Args = parser.parse_args()
 
-    for filename in args.files:
+    files = list(args.files)
+    process = functools.partial(process_file, validate=args.validate)
+
+    # The files are independent from each other, so sort them in parallel
+    # when there is more than one. Each one is reported once it is done.
+    if len(files) > 1:
+        with multiprocessing.Pool() as pool:
+            for filename in pool.imap(process, files):
+                if not args.quiet:
+                    print('Processed {}.'.format(filename))
+        return
+
+    for filename in files:
         if not args.quiet:
             print('Processing {}... '.format(filename), end='', flush=True)
 
-        genxml = intel_genxml.GenXml(filename)
-
-        if args.validate:
-            assert genxml.is_equivalent_xml(genxml.sorted_copy()), \
-                f'{filename} is invalid, run gen_sort_tags.py and commit that'
-        else:
-            genxml.sort()
-            genxml.write_file()
+        process(filename)
 
         if not args.quiet:
             print('done.')
@@ -6,10 +6,20 @@ from __future__ import annotations
 import argparse
 import copy
 import intel_genxml
+import multiprocessing
 import pathlib
 import typing
 
 
+def validate_file(filename: pathlib.Path) -> pathlib.Path:
+    genxml = intel_genxml.GenXml(filename)
+    original = copy.deepcopy(genxml)
+    genxml.optimize_xml_import()
+    assert genxml.is_equivalent_xml(original), \
+        f'{filename} is invalid, run genxml_import.py to fix it'
+    return filename
+
+
 def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument('files', nargs='*',
@@ -29,22 +39,30 @@ def main() -> None:
 
     filenames = list(args.files)
     intel_genxml.sort_genxml_files(filenames)
+
+    # Validation only reads the files, so they can be checked in parallel.
+    # Importing and flattening have to go in order, as each file reads the
+    # ones it imports back from disk.
+    if args.validate and len(filenames) > 1:
+        with multiprocessing.Pool() as pool:
+            for filename in pool.imap(validate_file, filenames):
+                if not args.quiet:
+                    print('Processed {}.'.format(filename))
+        return
+
     for filename in filenames:
         if not args.quiet:
             print('Processing {}... '.format(filename), end='', flush=True)
 
-        genxml = intel_genxml.GenXml(filename)
-
         if args.validate:
-            original = copy.deepcopy(genxml)
-            genxml.optimize_xml_import()
-            assert genxml.is_equivalent_xml(original), \
-                f'{filename} is invalid, run genxml_import.py to fix it'
+            validate_file(filename)
         elif args._import:
+            genxml = intel_genxml.GenXml(filename)
             genxml.add_xml_imports()
             genxml.optimize_xml_import()
             genxml.write_file()
         elif args.flatten:
+            genxml = intel_genxml.GenXml(filename)
             genxml.flatten_imported()
             genxml.write_file()
 
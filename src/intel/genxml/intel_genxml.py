@@ -3,8 +3,8 @@
 # SPDX-License-Identifier: MIT
 
 from __future__ import annotations
-from collections import OrderedDict
 import copy
+import functools
 import io
 import pathlib
 import os.path
@@ -32,8 +32,12 @@ def get_value(element: et.Element) -> int:
 def get_start(element: et.Element) -> int:
     return int(element.attrib['start'], 0)
 
+@functools.lru_cache(maxsize=None)
+def get_engines(engine: str) -> typing.FrozenSet[str]:
+    return frozenset(engine.split('|'))
 
-BASE_TYPES = {
+
+BASE_TYPES = frozenset({
     'address',
     'offset',
     'int',
@@ -42,42 +46,53 @@ BASE_TYPES = {
     'float',
     'mbz',
     'mbo',
-}
+})
 
 FIXED_PATTERN = re.compile(r"(s|u)(\d+)\.(\d+)")
 
+@functools.lru_cache(maxsize=None)
 def is_base_type(name: str) -> bool:
-    return name in BASE_TYPES or FIXED_PATTERN.match(name) is not None
-
-def add_struct_refs(items: typing.OrderedDict[str, bool], node: et.Element) -> None:
-    if node.tag == 'field':
-        if 'type' in node.attrib and not is_base_type(node.attrib['type']):
-            t = node.attrib['type']
+    return name in BASE_TYPES or FIXED_PATTERN.fullmatch(name) is not None
+
+def add_struct_refs(items: typing.Dict[str, bool], node: et.Element) -> None:
+    # Only struct and group elements nest fields, so a plain descendant
+    # search visits the same fields, in document order, entirely in C.
+    for f in node.iter('field'):
+        t = f.attrib.get('type')
+        if t is not None and not is_base_type(t):
             items[t] = True
-        return
-    if node.tag not in {'struct', 'group'}:
-        return
-    for c in node:
-        add_struct_refs(items, c)
 
 
 class Struct(object):
     def __init__(self, xml: et.Element):
         self.xml = xml
         self.name = xml.attrib['name']
-        self.deps: typing.OrderedDict[str, Struct] = OrderedDict()
+        self.deps: typing.Dict[str, Struct] = {}
 
     def find_deps(self, struct_dict, enum_dict) -> None:
-        deps: typing.OrderedDict[str, bool] = OrderedDict()
+        deps: typing.Dict[str, bool] = {}
         add_struct_refs(deps, self.xml)
         for d in deps.keys():
             if d in struct_dict:
                 self.deps[d] = struct_dict[d]
 
-    def add_xml(self, items: typing.OrderedDict[str, et.Element]) -> None:
-        for d in self.deps.values():
-            d.add_xml(items)
-        items[self.name] = self.xml
+    def add_xml(self, items: typing.Dict[str, et.Element]) -> None:
+        # A struct is only added after all its dependencies, so there is no
+        # need to walk them again if it is already there.
+        if self.name in items:
+            return
+        # Depth-first walk with an explicit stack of (struct, remaining
+        # deps) pairs, emitting each struct once all its deps are in.
+        stack = [(self, iter(self.deps.values()))]
+        while stack:
+            struct, deps = stack[-1]
+            for d in deps:
+                if d.name not in items:
+                    stack.append((d, iter(d.deps.values())))
+                    break
+            else:
+                stack.pop()
+                items[struct.name] = struct.xml
 
 
 # ordering of the various tag attributes
@@ -94,6 +109,15 @@ GENXML_DESC = {
     'register'    : [ 'name', 'length', 'num', ],
 }
 
+# set of valid attributes for each tag
+GENXML_ATTRS = {tag: frozenset(attrs) for tag, attrs in GENXML_DESC.items()}
+
+# position of each attribute in the GENXML_DESC ordering
+GENXML_RANK = {
+    tag: {attr: i for i, attr in enumerate(attrs)}
+    for tag, attrs in GENXML_DESC.items()
+}
+
 
 def node_validator(old: et.Element, new: et.Element) -> bool:
     """Compare to ElementTree Element nodes.
@@ -102,38 +126,55 @@ def node_validator(old: et.Element, new: et.Element) -> bool:
     equivalent to calling `et.Element is et.Element`. We instead want to compare
     that the contents are the same, including the order of children and attributes
     """
-    return (
-        # Check that the attributes are the same
-        old.tag == new.tag and
-        old.text == new.text and
-        (old.tail or "").strip() == (new.tail or "").strip() and
-        list(old.attrib.items()) == list(new.attrib.items()) and
-        len(old) == len(new) and
-
-        # check that there are no unexpected attributes
-        set(new.attrib).issubset(GENXML_DESC[new.tag]) and
-
-        # check that the attributes are sorted
-        list(new.attrib) == list(old.attrib) and
-        all(node_validator(f, s) for f, s in zip(old, new))
-    )
+    # Walk both trees side by side, bailing out on the first difference
+    stack = [(old, new)]
+    while stack:
+        old, new = stack.pop()
+        if not (
+            # Check that the attributes are the same
+            old.tag == new.tag and
+            old.text == new.text and
+            (old.tail or "").strip() == (new.tail or "").strip() and
+            old.attrib == new.attrib and
+            len(old) == len(new) and
+
+            # check that there are no unexpected attributes
+            GENXML_ATTRS[new.tag].issuperset(new.attrib) and
+
+            # check that the attributes are sorted
+            list(new.attrib) == list(old.attrib)
+        ):
+            return False
+        stack.extend(zip(old, new))
+    return True
 
 
 def process_attribs(elem: et.Element) -> None:
-    valid = GENXML_DESC[elem.tag]
-    # sort and prune attributes
-    elem.attrib = OrderedDict(sorted(((k, v) for k, v in elem.attrib.items() if k in valid),
-                                     key=lambda x: valid.index(x[0])))
-    for e in elem:
-        process_attribs(e)
+    # Element.iter() walks the whole subtree in C, no need to recurse
+    for e in elem.iter():
+        rank = GENXML_RANK[e.tag]
+        attrib = e.attrib
+        # sort and prune attributes, leaving them alone when they already
+        # are, which is the common case for files that were sorted before
+        keys = sorted(filter(rank.__contains__, attrib), key=rank.__getitem__)
+        if keys != list(attrib):
+            e.attrib = {k: attrib[k] for k in keys}
 
 
 def sort_xml(xml: et.ElementTree) -> None:
     genxml = xml.getroot()
 
-    imports = xml.findall('import')
+    # Split the top level items by tag in a single pass
+    by_tag: typing.Dict[str, typing.List[et.Element]] = {
+        tag: [] for tag in ('import', 'enum', 'struct', 'instruction', 'register')
+    }
+    for item in genxml:
+        if item.tag in by_tag:
+            by_tag[item.tag].append(item)
+
+    imports = by_tag['import']
 
-    enums = sorted(xml.findall('enum'), key=get_name)
+    enums = sorted(by_tag['enum'], key=get_name)
     enum_dict: typing.Dict[str, et.Element] = {}
     for e in enums:
         e[:] = sorted(e, key=get_value)
@@ -142,7 +183,7 @@ def sort_xml(xml: et.ElementTree) -> None:
     # Structs are a bit annoying because they can refer to each other. We sort
     # them alphabetically and then build a graph of dependencies. Finally we go
     # through the alphabetically sorted list and print out dependencies first.
-    structs = sorted(xml.findall('./struct'), key=get_name)
+    structs = sorted(by_tag['struct'], key=get_name)
     wrapped_struct_dict: typing.Dict[str, Struct] = {}
     for s in structs:
         s[:] = sorted(s, key=get_start)
@@ -152,16 +193,17 @@ def sort_xml(xml: et.ElementTree) -> None:
     for ws in wrapped_struct_dict.values():
         ws.find_deps(wrapped_struct_dict, enum_dict)
 
-    sorted_structs: typing.OrderedDict[str, et.Element] = OrderedDict()
-    for s in structs:
-        _s = wrapped_struct_dict[s.attrib['name']]
-        _s.add_xml(sorted_structs)
+    # wrapped_struct_dict is filled in alphabetical order, so there is no
+    # need to look each struct up by name again.
+    sorted_structs: typing.Dict[str, et.Element] = {}
+    for ws in wrapped_struct_dict.values():
+        ws.add_xml(sorted_structs)
 
-    instructions = sorted(xml.findall('./instruction'), key=get_name)
+    instructions = sorted(by_tag['instruction'], key=get_name)
     for i in instructions:
         i[:] = sorted(i, key=get_start)
 
-    registers = sorted(xml.findall('./register'), key=get_name)
+    registers = sorted(by_tag['register'], key=get_name)
     for r in registers:
         r[:] = sorted(r, key=get_start)
 
@@ -180,21 +222,21 @@ def sort_xml(xml: et.ElementTree) -> None:
 # --import switch to know which files should be added as an import.
 # (genxml_import.py uses GenXml.add_xml_imports, which relies on
 # `default_imports`.)
-default_imports = OrderedDict([
-    ('gen4.xml', ()),
-    ('gen45.xml', ('gen4.xml',)),
-    ('gen5.xml', ('gen45.xml',)),
-    ('gen6.xml', ('gen5.xml',)),
-    ('gen7.xml', ('gen6.xml',)),
-    ('gen75.xml', ('gen7.xml',)),
-    ('gen8.xml', ('gen75.xml',)),
-    ('gen9.xml', ('gen8.xml',)),
-    ('gen11.xml', ('gen9.xml',)),
-    ('gen12.xml', ('gen11.xml',)),
-    ('gen125.xml', ('gen12.xml',)),
-    ('gen20.xml', ('gen125.xml',)),
-    ('gen20_rt.xml', ('gen125_rt.xml',)),
-    ])
+default_imports = {
+    'gen4.xml': (),
+    'gen45.xml': ('gen4.xml',),
+    'gen5.xml': ('gen45.xml',),
+    'gen6.xml': ('gen5.xml',),
+    'gen7.xml': ('gen6.xml',),
+    'gen75.xml': ('gen7.xml',),
+    'gen8.xml': ('gen75.xml',),
+    'gen9.xml': ('gen8.xml',),
+    'gen11.xml': ('gen9.xml',),
+    'gen12.xml': ('gen11.xml',),
+    'gen125.xml': ('gen12.xml',),
+    'gen20.xml': ('gen125.xml',),
+    'gen20_rt.xml': ('gen125_rt.xml',),
+}
 known_genxml_files = list(default_imports.keys())
 
 
@@ -208,6 +250,19 @@ def genxml_path_to_key(path):
 def sort_genxml_files(files):
     files.sort(key=genxml_path_to_key)
 
+
+def index_by_name(elements) -> typing.Dict[str, typing.Dict[str, et.Element]]:
+    """Index the top level enums, structs, instructions and registers by tag
+    and then by name."""
+    index: typing.Dict[str, typing.Dict[str, et.Element]] = {
+        tag: {} for tag in ('enum', 'struct', 'instruction', 'register')
+    }
+    for e in elements:
+        if e.tag in index:
+            index[e.tag][get_name(e)] = e
+    return index
+
+
 class GenXml(object):
     def __init__(self, filename, import_xml=False, files=None):
         if files is not None:
@@ -242,96 +297,90 @@ class GenXml(object):
 
         """
         assert merge != drop_dupes
-        orig_elements = set(self.et.getroot())
-        name_and_obj = lambda i: (get_name(i), i)
-        filter_ty = lambda s: filter(lambda i: i.tag == s, orig_elements)
-        filter_ty_item = lambda s: dict(map(name_and_obj, filter_ty(s)))
+        orig_elements = list(self.et.getroot())
 
         # orig_by_tag stores items defined directly in the genxml
         # file. If a genxml item is defined in the genxml directly,
         # then any imported items of the same name are ignored.
-        orig_by_tag = {
-            'enum': filter_ty_item('enum'),
-            'struct': filter_ty_item('struct'),
-            'instruction': filter_ty_item('instruction'),
-            'register': filter_ty_item('register'),
-        }
+        orig_by_tag = index_by_name(orig_elements)
+
+        # `to_add` is a list of items that were imported an should be
+        # merged into the `self.et` data structure. This is only used
+        # when the `merge` parameter is True.
+        to_add = []
+        # `to_remove` is a set of items that can safely be imported
+        # since the item is equivalent. This is only used when the
+        # `drop_duped` parameter is True.
+        to_remove = set()
 
         for item in orig_elements:
-            if item.tag == 'import':
-                assert 'name' in item.attrib
-                filename = os.path.split(item.attrib['name'])
-                exceptions = set()
-                for e in item:
-                    assert e.tag == 'exclude'
-                    exceptions.add(e.attrib['name'])
-                # We should be careful to restrict loaded files to
-                # those under the source or build trees. For now, only
-                # allow siblings of the current xml file.
-                assert filename[0] == '', 'Directories not allowed with import'
-                filename = os.path.join(os.path.dirname(self.filename),
-                                        filename[1])
-                assert os.path.exists(filename), f'{self.filename} {filename}'
-
-                # Here we load the imported genxml file. We set
-                # `import_xml` to true so that any imports in the
-                # imported genxml will be merged during the loading
-                # process.
-                #
-                # The `files` parameter is a set of files that have
-                # been loaded, and it is used to prevent any cycles
-                # (infinite recursion) while loading imported genxml
-                # files.
-                genxml = GenXml(filename, import_xml=True, files=self.files)
-                imported_elements = set(genxml.et.getroot())
-
-                # `to_add` is a set of items that were imported an
-                # should be merged into the `self.et` data structure.
-                # This is only used when the `merge` parameter is
-                # True.
-                to_add = set()
-                # `to_remove` is a set of items that can safely be
-                # imported since the item is equivalent. This is only
-                # used when the `drop_duped` parameter is True.
-                to_remove = set()
-                for i in imported_elements:
-                    if i.tag not in orig_by_tag:
+            if item.tag != 'import':
+                continue
+            assert 'name' in item.attrib
+            filename = os.path.split(item.attrib['name'])
+            exceptions = set()
+            for e in item:
+                assert e.tag == 'exclude'
+                exceptions.add(e.attrib['name'])
+            # We should be careful to restrict loaded files to
+            # those under the source or build trees. For now, only
+            # allow siblings of the current xml file.
+            assert filename[0] == '', 'Directories not allowed with import'
+            filename = os.path.join(os.path.dirname(self.filename),
+                                    filename[1])
+            assert os.path.exists(filename), f'{self.filename} {filename}'
+
+            # Here we load the imported genxml file. We set
+            # `import_xml` to true so that any imports in the
+            # imported genxml will be merged during the loading
+            # process.
+            #
+            # The `files` parameter is a set of files that have
+            # been loaded, and it is used to prevent any cycles
+            # (infinite recursion) while loading imported genxml
+            # files.
+            genxml = GenXml(filename, import_xml=True, files=self.files)
+
+            for i in genxml.et.getroot():
+                orig_by_name = orig_by_tag.get(i.tag)
+                if orig_by_name is None:
+                    continue
+                name = i.attrib['name']
+                if name in exceptions:
+                    continue
+                if name in orig_by_name:
+                    if merge:
+                        # An item with this same name was defined
+                        # in the genxml directly. There we should
+                        # ignore (not merge) the imported item.
                         continue
-                    if i.attrib['name'] in exceptions:
+                else:
+                    if drop_dupes:
+                        # Since this item is not the imported
+                        # genxml, we can't consider dropping it.
                         continue
-                    if i.attrib['name'] in orig_by_tag[i.tag]:
-                        if merge:
-                            # An item with this same name was defined
-                            # in the genxml directly. There we should
-                            # ignore (not merge) the imported item.
-                            continue
-                    else:
-                        if drop_dupes:
-                            # Since this item is not the imported
-                            # genxml, we can't consider dropping it.
-                            continue
-                    if merge:
-                        to_add.add(i)
-                    else:
-                        assert drop_dupes
-                        orig_element = orig_by_tag[i.tag][i.attrib['name']]
-                        if not node_validator(i, orig_element):
-                            continue
-                        to_remove.add(orig_element)
-
-                if len(to_add) > 0:
-                    # Now that we have scanned through all the items
-                    # in the imported genxml file, if any items were
-                    # found which should be merged, we add them into
-                    # our `self.et` data structure. After this it will
-                    # be as if the items had been directly present in
-                    # the genxml file.
-                    assert len(to_remove) == 0
-                    self.et.getroot().extend(list(to_add))
-                    sort_xml(self.et)
-                elif len(to_remove) > 0:
-                    self.et.getroot()[:] = list(orig_elements - to_remove)
-                    sort_xml(self.et)
+                if merge:
+                    to_add.append(i)
+                else:
+                    assert drop_dupes
+                    orig_element = orig_by_name[name]
+                    if not node_validator(i, orig_element):
+                        continue
+                    to_remove.add(orig_element)
+
+        if len(to_add) > 0:
+            # Now that we have scanned through all the items in the
+            # imported genxml files, if any items were found which
+            # should be merged, we add them into our `self.et` data
+            # structure. After this it will be as if the items had been
+            # directly present in the genxml file.
+            assert len(to_remove) == 0
+            self.et.getroot().extend(to_add)
+            sort_xml(self.et)
+        elif len(to_remove) > 0:
+            self.et.getroot()[:] = [e for e in orig_elements
+                                    if e not in to_remove]
+            sort_xml(self.et)
 
     def merge_imported(self):
         """Merge imported items from genxml imports.
@@ -416,22 +465,18 @@ class GenXml(object):
         self.process_imported(drop_dupes=True)
 
     def filter_engines(self, engines):
-        changed = False
-        items = []
-        for item in self.et.getroot():
-            # When an instruction doesn't have the engine specified,
-            # it is considered to be for all engines. Otherwise, we
-            # check to see if it's tagged for the engines requested.
-            if item.tag == 'instruction' and 'engine' in item.attrib:
-                i_engines = set(item.attrib["engine"].split('|'))
-                if not (i_engines & engines):
-                    # Drop this instruction because it doesn't support
-                    # the requested engine types.
-                    changed = True
-                    continue
-            items.append(item)
-        if changed:
-            self.et.getroot()[:] = items
+        root = self.et.getroot()
+        # When an instruction doesn't have the engine specified,
+        # it is considered to be for all engines. Otherwise, we
+        # check to see if it's tagged for the engines requested.
+        # Engine strings repeat a lot, so their parsed sets are cached.
+        items = [item for item in root
+                 if not (item.tag == 'instruction' and
+                         'engine' in item.attrib and
+                         get_engines(item.attrib['engine']).isdisjoint(engines))]
+        # Only rewrite the children if some instructions were dropped
+        if len(items) != len(root):
+            root[:] = items
 
     def sort(self):
         sort_xml(self.et)
@@ -442,24 +487,27 @@ class GenXml(object):
         return clone
 
     def is_equivalent_xml(self, other):
-        if len(self.et.getroot()) != len(other.et.getroot()):
-            return False
-        return all(node_validator(old, new)
-                   for old, new in zip(self.et.getroot(), other.et.getroot()))
+        # Items are only ever reordered, pruned of invalid attributes or
+        # dropped, all of which show up in the serialized trees. Comparing
+        # those in C is much faster than walking both trees in Python.
+        return et.tostring(self.et.getroot()) == et.tostring(other.et.getroot())
 
     def write_file(self):
-        try:
-            old_genxml = GenXml(self.filename)
-            if self.is_equivalent_xml(old_genxml):
-                return
-        except Exception:
-            pass
-
         b_io = io.BytesIO()
         et.indent(self.et, space='  ')
         self.et.write(b_io, encoding="utf-8", xml_declaration=True)
         b_io.write(b'\n')
+        # getbuffer() exposes the serialized bytes without copying them.
+        data = b_io.getbuffer()
+
+        # Comparing the serialized bytes is much cheaper than parsing the
+        # old file again to compare the trees. Checkouts may use CRLF line
+        # endings, which shouldn't count as a change.
+        if (self.filename.exists() and
+            self.filename.read_bytes().replace(b'\r\n', b'\n') == data):
+            return
 
         tmp = self.filename.with_suffix(f'{self.filename.suffix}.tmp')
-        tmp.write_bytes(b_io.getvalue())
-        tmp.replace(self.filename)
+        with tmp.open('wb') as f:
+            f.write(data)
+        os.replace(tmp, self.filename)
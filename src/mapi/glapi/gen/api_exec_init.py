@@ -25,7 +25,6 @@
 # entries in the "OutsideBeginEnd" dispatch table.
 
 import argparse
-import collections
 import license
 import gl_XML
 import sys
@@ -94,36 +93,41 @@ class PrintCode(gl_XML.gl_print_base):
     def printBody(self, api):
         # Collect SET_* calls by the condition under which they should
         # be called.
-        settings_by_condition = collections.defaultdict(lambda: [])
+        settings_by_condition = {}
         for f in api.functionIterateAll():
-            if f.exec_flavor not in exec_flavor_map:
+            name = f.name
+            exec_flavor = f.exec_flavor
+            if exec_flavor not in exec_flavor_map:
                 raise Exception(
-                    'Unrecognized exec flavor {0!r}'.format(f.exec_flavor))
+                    'Unrecognized exec flavor {0!r}'.format(exec_flavor))
             condition = apiexec.get_api_condition(f)
             if not condition:
                 continue
-            prefix = exec_flavor_map[f.exec_flavor]
+            prefix = exec_flavor_map[exec_flavor]
             if prefix is None:
                 # This function is not implemented, or is dispatched
                 # via beginend.
                 continue
             if f.has_no_error_variant:
-                no_error_condition = '_mesa_is_no_error_enabled(ctx) && ({0})'.format(condition)
-                error_condition = '!_mesa_is_no_error_enabled(ctx) && ({0})'.format(condition)
-                settings_by_condition[no_error_condition].append(
-                    'SET_{0}(table, {1}{0}_no_error);'.format(f.name, prefix, f.name))
-                settings_by_condition[error_condition].append(
-                    'SET_{0}(table, {1}{0});'.format(f.name, prefix, f.name))
+                settings_by_condition.setdefault(
+                    f'_mesa_is_no_error_enabled(ctx) && ({condition})', []).append(
+                    f'SET_{name}(table, {prefix}{name}_no_error);')
+                settings_by_condition.setdefault(
+                    f'!_mesa_is_no_error_enabled(ctx) && ({condition})', []).append(
+                    f'SET_{name}(table, {prefix}{name});')
             else:
-                settings_by_condition[condition].append(
-                    'SET_{0}(table, {1}{0});'.format(f.name, prefix, f.name))
+                settings_by_condition.setdefault(condition, []).append(
+                    f'SET_{name}(table, {prefix}{name});')
         # Print out an if statement for each unique condition, with
-        # the SET_* calls nested inside it.
+        # the SET_* calls nested inside it.  The lines are collected
+        # and written out in one go rather than print()ed one by one.
+        lines = []
         for condition in sorted(settings_by_condition.keys()):
-            print('   if ({0}) {{'.format(condition))
+            lines.append('   if ({0}) {{\n'.format(condition))
             for setting in sorted(settings_by_condition[condition]):
-                print('      {0}'.format(setting))
-            print('   }')
+                lines.append('      {0}\n'.format(setting))
+            lines.append('   }\n')
+        sys.stdout.write(''.join(lines))
 
 
 if __name__ == '__main__':
@@ -4,6 +4,7 @@
 # probably needs python3.9
 
 import argparse
+import functools
 import os.path
 import sys
 
@@ -63,22 +64,22 @@ TEMPLATE_H = Template("""\
 #include <stdio.h>
 #include "util/u_math.h"
 
-%for mthd in mthddict:
-struct nv_${nvcl.lower()}_${mthd} {
-  %for field_name in mthddict[mthd].field_name_start:
+%for mthd, m in mthddict.items():
+<% struct_name = f"nv_{nvcl.lower()}_{mthd}" %>\
+struct ${struct_name} {
+  %for field_name in m.field_name_start:
     uint32_t ${field_name.lower()};
   %endfor
 };
 
 static inline void
-__${nvcl}_${mthd}(uint32_t *val_out, struct nv_${nvcl.lower()}_${mthd} st)
+__${nvcl}_${mthd}(uint32_t *val_out, struct ${struct_name} st)
 {
     uint32_t val = 0;
-  %for field_name in mthddict[mthd].field_name_start:
+  %for field_name in m.field_name_start:
     <%
-        field_start = int(mthddict[mthd].field_name_start[field_name])
-        field_end = int(mthddict[mthd].field_name_end[field_name])
-        field_width = field_end - field_start + 1
+        field_start = m.field_name_start[field_name]
+        field_width = m.field_width[field_name]
     %>
     %if field_width == 32:
     val |= st.${field_name.lower()};
@@ -91,39 +92,39 @@ __${nvcl}_${mthd}(uint32_t *val_out, struct nv_${nvcl.lower()}_${mthd} st)
 }
 
 #define V_${nvcl}_${mthd}(val, args...) { ${bs}
-  %for field_name in mthddict[mthd].field_name_start:
-    %for d in mthddict[mthd].field_defs[field_name]:
+  %for field_name in m.field_name_start:
+    %for d in m.field_defs[field_name]:
     UNUSED uint32_t ${field_name}_${d} = ${nvcl}_${mthd}_${field_name}_${d}; ${bs}
     %endfor
   %endfor
-  %if len(mthddict[mthd].field_name_start) > 1:
-    struct nv_${nvcl.lower()}_${mthd} __data = args; ${bs}
+  %if len(m.field_name_start) > 1:
+    struct ${struct_name} __data = args; ${bs}
   %else:
-<% field_name = next(iter(mthddict[mthd].field_name_start)).lower() %>\
-    struct nv_${nvcl.lower()}_${mthd} __data = { .${field_name} = (args) }; ${bs}
+<% field_name = next(iter(m.field_name_start)).lower() %>\
+    struct ${struct_name} __data = { .${field_name} = (args) }; ${bs}
   %endif
     __${nvcl}_${mthd}(&val, __data); ${bs}
 }
 
-%if mthddict[mthd].is_array:
+%if m.is_array:
 #define VA_${nvcl}_${mthd}(i) V_${nvcl}_${mthd}
 %else:
 #define VA_${nvcl}_${mthd} V_${nvcl}_${mthd}
 %endif
 
-%if mthddict[mthd].is_array:
+%if m.is_array:
 #define P_${nvcl}_${mthd}(push, idx, args...) do { ${bs}
 %else:
 #define P_${nvcl}_${mthd}(push, args...) do { ${bs}
 %endif
-  %for field_name in mthddict[mthd].field_name_start:
-    %for d in mthddict[mthd].field_defs[field_name]:
+  %for field_name in m.field_name_start:
+    %for d in m.field_defs[field_name]:
     UNUSED uint32_t ${field_name}_${d} = ${nvcl}_${mthd}_${field_name}_${d}; ${bs}
     %endfor
   %endfor
     uint32_t nvk_p_ret; ${bs}
     V_${nvcl}_${mthd}(nvk_p_ret, args); ${bs}
-    %if mthddict[mthd].is_array:
+    %if m.is_array:
     nv_push_val(push, ${nvcl}_${mthd}(idx), nvk_p_ret); ${bs}
     %else:
     nv_push_val(push, ${nvcl}_${mthd}, nvk_p_ret); ${bs}
@@ -146,12 +147,12 @@ const char*
 P_PARSE_${nvcl}_MTHD(uint16_t idx)
 {
     switch (idx) {
-%for mthd in mthddict:
-  %if mthddict[mthd].is_array and mthddict[mthd].array_size == 0:
+%for mthd, m in mthddict.items():
+  %if m.is_array and m.array_size == 0:
     <% continue %>
   %endif
-  %if mthddict[mthd].is_array:
-    %for i in range(mthddict[mthd].array_size):
+  %if m.is_array:
+    %for i in range(m.array_size):
     case ${nvcl}_${mthd}(${i}):
         return "${nvcl}_${mthd}(${i})";
     %endfor
@@ -171,22 +172,21 @@ P_DUMP_${nvcl}_MTHD_DATA(FILE *fp, uint16_t idx, uint32_t data,
 {
     uint32_t parsed;
     switch (idx) {
-%for mthd in mthddict:
-  %if mthddict[mthd].is_array and mthddict[mthd].array_size == 0:
+%for mthd, m in mthddict.items():
+  %if m.is_array and m.array_size == 0:
     <% continue %>
   %endif
-  %if mthddict[mthd].is_array:
-    %for i in range(mthddict[mthd].array_size):
+  %if m.is_array:
+    %for i in range(m.array_size):
     case ${nvcl}_${mthd}(${i}):
     %endfor
   % else:
     case ${nvcl}_${mthd}:
   %endif
-  %for field_name in mthddict[mthd].field_name_start:
+  %for field_name in m.field_name_start:
     <%
-        field_start = int(mthddict[mthd].field_name_start[field_name])
-        field_end = int(mthddict[mthd].field_name_end[field_name])
-        field_width = field_end - field_start + 1
+        field_start = m.field_name_start[field_name]
+        field_width = m.field_width[field_name]
     %>
     %if field_width == 32:
         parsed = data;
@@ -194,9 +194,9 @@ P_DUMP_${nvcl}_MTHD_DATA(FILE *fp, uint16_t idx, uint32_t data,
         parsed = (data >> ${field_start}) & ((1u << ${field_width}) - 1);
     %endif
         fprintf(fp, "%s.${field_name} = ", prefix);
-    %if len(mthddict[mthd].field_defs[field_name]):
+    %if len(m.field_defs[field_name]):
         switch (parsed) {
-      %for d in mthddict[mthd].field_defs[field_name]:
+      %for d in m.field_defs[field_name]:
         case ${nvcl}_${mthd}_${field_name}_${d}:
             fprintf(fp, "${d}${bs}n");
             break;
@@ -206,7 +206,7 @@ P_DUMP_${nvcl}_MTHD_DATA(FILE *fp, uint16_t idx, uint32_t data,
             break;
         }
     %else:
-      %if mthddict[mthd].is_float:
+      %if m.is_float:
         fprintf(fp, "%ff (0x%x)${bs}n", uif(parsed), parsed);
       %else:
         fprintf(fp, "(0x%x)${bs}n", parsed);
@@ -222,30 +222,47 @@ P_DUMP_${nvcl}_MTHD_DATA(FILE *fp, uint16_t idx, uint32_t data,
 }
 """)
 
-def glob_match(glob, name):
-    if glob.endswith('*'):
-        return name.startswith(glob[:-1])
-    else:
-        assert '*' not in glob
-        return name == glob
+def split_globs(globs):
+    """Split a glob -> value dict into exact names and (prefix, value) pairs"""
+    exact = {}
+    prefixes = []
+    for (glob, value) in globs.items():
+        if glob.endswith('*'):
+            prefixes.append((glob[:-1], value))
+        else:
+            assert '*' not in glob
+            exact[glob] = value
+    return exact, prefixes
+
+# Exact names only need a dict lookup, leaving just the globs to scan
+METHOD_ARRAY_SIZES_EXACT, METHOD_ARRAY_SIZES_PREFIX = \
+    split_globs(METHOD_ARRAY_SIZES)
+METHOD_IS_FLOAT_EXACT = frozenset(
+    glob for glob in METHOD_IS_FLOAT if not glob.endswith('*'))
+METHOD_IS_FLOAT_PREFIXES = tuple(
+    glob[:-1] for glob in METHOD_IS_FLOAT if glob.endswith('*'))
 
 class method(object):
-    @property
+    # These are looked up several times per method while rendering the
+    # templates, but only depend on the name, so compute them once.
+    @functools.cached_property
     def array_size(self):
-        for (glob, value) in METHOD_ARRAY_SIZES.items():
-            if glob_match(glob, self.name):
+        if self.name in METHOD_ARRAY_SIZES_EXACT:
+            return METHOD_ARRAY_SIZES_EXACT[self.name]
+        for (prefix, value) in METHOD_ARRAY_SIZES_PREFIX:
+            if self.name.startswith(prefix):
                 return value
         return 0
 
-    @property
+    @functools.cached_property
     def is_float(self):
-        for glob in METHOD_IS_FLOAT:
-            if glob_match(glob, self.name):
-                assert len(self.field_defs) == 1
-                return True
+        if (self.name in METHOD_IS_FLOAT_EXACT or
+            self.name.startswith(METHOD_IS_FLOAT_PREFIXES)):
+            assert len(self.field_defs) == 1
+            return True
         return False
 
-def parse_header(nvcl, f):
+def parse_header(nvcl, lines):
     # Simple state machine
     # state 0 looking for a new method define
     # state 1 looking for new fields in a method
@@ -255,7 +272,7 @@ def parse_header(nvcl, f):
     state = 0
     mthddict = {}
     curmthd = {}
-    for line in f:
+    for line in lines:
 
         if line.strip() == "":
             state = 0
@@ -266,35 +283,40 @@ def parse_header(nvcl, f):
             continue
 
         if line.startswith("#define"):
-            list = line.split();
-            if "_cl_" in list[1]:
+            # Only the define's name and value are used, don't split the
+            # rest of the line (trailing comments and such).
+            tokens = line.split(maxsplit=3)
+            define_name = tokens[1]
+            # Skip defines for other classes, the header guard and typedefs
+            if (not define_name.startswith(nvcl) or
+                "_cl_" in define_name or
+                define_name.endswith("TYPEDEF")):
                 continue
 
-            if not list[1].startswith(nvcl):
-                continue
-
-            if list[1].endswith("TYPEDEF"):
-                continue
+            define_value = tokens[2]
 
             if state == 2:
-                teststr = nvcl + "_" + curmthd.name + "_" + curfield + "_"
-                if ":" in list[2]:
+                teststr = f"{nvcl}_{curmthd.name}_{curfield}_"
+                if ":" in define_value:
                     state = 1
-                elif teststr in list[1]:
-                    curmthd.field_defs[curfield][list[1].removeprefix(teststr)] = list[2]
+                elif teststr in define_name:
+                    curmthd.field_defs[curfield][define_name.removeprefix(teststr)] = define_value
                 else:
                     state = 1
 
             if state == 1:
-                teststr = nvcl + "_" + curmthd.name + "_"
-                if teststr in list[1]:
-                    if ("0x" in list[2]):
+                teststr = f"{nvcl}_{curmthd.name}_"
+                if teststr in define_name:
+                    if ("0x" in define_value):
                         state = 1
                     else:
-                        field = list[1].removeprefix(teststr)
-                        bitfield = list[2].split(":")
-                        curmthd.field_name_start[field] = bitfield[1]
-                        curmthd.field_name_end[field] = bitfield[0]
+                        field = define_name.removeprefix(teststr)
+                        bitfield = define_value.split(":")
+                        field_start = int(bitfield[1])
+                        field_end = int(bitfield[0])
+                        curmthd.field_name_start[field] = field_start
+                        curmthd.field_name_end[field] = field_end
+                        curmthd.field_width[field] = field_end - field_start + 1
                         curmthd.field_defs[field] = {}
                         curfield = field
                         state = 2
@@ -308,11 +330,11 @@ def parse_header(nvcl, f):
                 if (curmthd):
                     if not len(curmthd.field_name_start):
                         del mthddict[curmthd.name]
-                teststr = nvcl + "_"
+                teststr = f"{nvcl}_"
                 is_array = 0
-                if (':' in list[2]):
+                if (':' in define_value):
                     continue
-                name = list[1].removeprefix(teststr)
+                name = define_name.removeprefix(teststr)
                 if name.endswith("(i)"):
                     is_array = 1
                     name = name.removesuffix("(i)")
@@ -321,10 +343,11 @@ def parse_header(nvcl, f):
                     name = name.removesuffix("(j)")
                 x = method()
                 x.name = name
-                x.addr = list[2]
+                x.addr = define_value
                 x.is_array = is_array
                 x.field_name_start = {}
                 x.field_name_end = {}
+                x.field_width = {}
                 x.field_defs = {}
                 mthddict[x.name] = x
 
@@ -349,8 +372,10 @@ def main():
     nvcl = nvcl.upper()
     nvcl = "NV" + nvcl
 
+    # Read the whole header at once rather than line by line
     with open(args.in_h, 'r', encoding='utf-8') as f:
-        mthddict = parse_header(nvcl, f)
+        lines = f.read().splitlines()
+    mthddict = parse_header(nvcl, lines)
 
     environment = {
         'clheader': clheader,
@@ -24,6 +24,7 @@
 from mako.template import Template
 from collections import namedtuple
 from enum import IntEnum
+import functools
 import os
 
 TRACEPOINTS = {}
@@ -498,6 +499,11 @@ void __trace_${trace_name}(
 % endfor
 """
 
+@functools.lru_cache(maxsize=None)
+def get_template(source):
+    """Compile a template on first use and reuse it afterwards"""
+    return Template(source)
+
 def utrace_generate(cpath, hpath, ctx_param, trace_toggle_name=None,
                     trace_toggle_defaults=[]):
     """Parameters:
@@ -510,9 +516,9 @@ def utrace_generate(cpath, hpath, ctx_param, trace_toggle_name=None,
     - trace_toggle_defaults: (optional) list of tracepoints enabled by default.
     """
     if cpath is not None:
-        hdr = os.path.basename(cpath).rsplit('.', 1)[0] + '.h'
+        hdr = os.path.splitext(os.path.basename(cpath))[0] + '.h'
         with open(cpath, 'w', encoding='utf-8') as f:
-            f.write(Template(src_template).render(
+            f.write(get_template(src_template).render(
                 hdr=hdr,
                 ctx_param=ctx_param,
                 trace_toggle_name=trace_toggle_name,
@@ -524,8 +530,8 @@ def utrace_generate(cpath, hpath, ctx_param, trace_toggle_name=None,
     if hpath is not None:
         hdr = os.path.basename(hpath)
         with open(hpath, 'w', encoding='utf-8') as f:
-            f.write(Template(hdr_template).render(
-                hdrname=hdr.rstrip('.h').upper(),
+            f.write(get_template(hdr_template).render(
+                hdrname=os.path.splitext(hdr)[0].upper(),
                 ctx_param=ctx_param,
                 trace_toggle_name=trace_toggle_name,
                 HEADERS=[h for h in HEADERS if h.scope & HeaderScope.HEADER],
@@ -608,8 +614,8 @@ def utrace_generate_perfetto_utils(hpath,basename="tracepoint"):
     if hpath is not None:
         hdr = os.path.basename(hpath)
         with open(hpath, 'w', encoding='utf-8') as f:
-            f.write(Template(perfetto_utils_hdr_template).render(
+            f.write(get_template(perfetto_utils_hdr_template).render(
                 basename=basename,
-                hdrname=hdr.rstrip('.h').upper(),
+                hdrname=os.path.splitext(hdr)[0].upper(),
                 HEADERS=[h for h in HEADERS if h.scope & HeaderScope.PERFETTO],
                 TRACEPOINTS=TRACEPOINTS))
@@ -170,10 +170,12 @@ class Requirements:
         self.extensions.append(ext)
 
 def filter_api(elem, api):
-    if 'api' not in elem.attrib:
+    # Most elements don't restrict the API, so that is a single lookup
+    elem_api = elem.attrib.get('api')
+    if elem_api is None:
         return True
 
-    return api in elem.attrib['api'].split(',')
+    return api in elem_api.split(',')
 
 def get_all_required(xml, thing, api, beta):
     things = {}
@@ -23,7 +23,6 @@ COPYRIGHT=u"""
 """
 
 import argparse
-from collections import OrderedDict
 from dataclasses import dataclass
 import os
 import sys
@@ -337,31 +336,35 @@ vk_set_physical_device_features_1_0(struct vk_features *all_features,
 }
 """)
 
+def get_member_type_and_name(member):
+    """Returns the <type> and <name> text of a struct member, reading the
+    member's children in a single pass."""
+    m_type = m_name = None
+    for child in member:
+        if child.tag == 'type':
+            m_type = child.text
+        elif child.tag == 'name':
+            m_name = child.text
+    return m_type, m_name
+
 def get_pdev_features(doc):
     _type = doc.find(".types/type[@name='VkPhysicalDeviceFeatures']")
     if _type is not None:
         flags = []
         for p in _type.findall('./member'):
-            assert p.find('./type').text == 'VkBool32'
-            flags.append(p.find('./name').text)
+            m_type, m_name = get_member_type_and_name(p)
+            assert m_type == 'VkBool32'
+            flags.append(m_name)
         return flags
     return None
 
-def filter_api(elem, api):
-    if 'api' not in elem.attrib:
-        return True
-
-    return api in elem.attrib['api'].split(',')
-
 def get_feature_structs(doc, api, beta):
-    feature_structs = OrderedDict()
+    feature_structs = {}
 
     required = get_all_required(doc, 'type', api, beta)
 
     # parse all struct types where structextends VkPhysicalDeviceFeatures2
-    for _type in doc.findall('./types/type[@category="struct"]'):
-        if _type.attrib.get('structextends') != 'VkPhysicalDeviceFeatures2,VkDeviceCreateInfo':
-            continue
+    for _type in doc.findall('./types/type[@category="struct"][@structextends="VkPhysicalDeviceFeatures2,VkDeviceCreateInfo"]'):
         if _type.attrib['name'] not in required:
             continue
 
@@ -370,31 +373,28 @@ def get_feature_structs(doc, api, beta):
         if guard is not None and (guard != "VK_ENABLE_BETA_EXTENSIONS" or not beta):
             continue
 
-        # find Vulkan structure type
-        for elem in _type:
-            if "STRUCTURE_TYPE" in str(elem.attrib):
-                s_type = elem.attrib.get('values')
-
-        # collect a list of feature flags
+        # collect the Vulkan structure type and a list of feature flags
+        s_type = None
         flags = []
 
         for p in _type.findall('./member'):
             if not filter_api(p, api):
                 continue
 
-            m_name = p.find('./name').text
+            m_type, m_name = get_member_type_and_name(p)
             if m_name == 'pNext':
                 pass
             elif m_name == 'sType':
                 s_type = p.attrib.get('values')
             else:
-                assert p.find('./type').text == 'VkBool32'
+                assert m_type == 'VkBool32'
                 flags.append(m_name)
+        assert s_type is not None, _type.attrib['name']
 
         feature_struct = FeatureStruct(c_type=_type.attrib.get('name'), s_type=s_type, features=flags)
         feature_structs[feature_struct.c_type] = feature_struct
 
-    return feature_structs.values()
+    return list(feature_structs.values())
 
 def get_feature_structs_from_xml(xml_files, beta, api='vulkan'):
     diagnostics = []
@@ -410,7 +410,7 @@ def get_feature_structs_from_xml(xml_files, beta, api='vulkan'):
 
     unused_renames = {**RENAMED_FEATURES}
 
-    features = OrderedDict()
+    features = {}
 
     for flag in pdev_features:
         features[flag] = 'VkPhysicalDeviceFeatures'
@@ -436,6 +436,19 @@ def get_feature_structs_from_xml(xml_files, beta, api='vulkan'):
     return pdev_features, feature_structs, features
 
 
+def write_if_different(path, contents):
+    """
+    Avoid touching the output file if it doesn't need modifications
+    Useful to avoid triggering rebuilds when nothing has changed.
+    """
+    if os.path.isfile(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.read() == contents:
+                return
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(contents)
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--out-c', required=True, help='Output C file.')
@@ -457,10 +470,8 @@ def main():
     }
 
     try:
-        with open(args.out_c, 'w', encoding='utf-8') as f:
-            f.write(TEMPLATE_C.render(**environment))
-        with open(args.out_h, 'w', encoding='utf-8') as f:
-            f.write(TEMPLATE_H.render(**environment))
+        write_if_different(args.out_c, TEMPLATE_C.render(**environment))
+        write_if_different(args.out_h, TEMPLATE_H.render(**environment))
     except Exception:
         # In the event there's an error, this uses some helpers from mako
         # to print a useful stack trace and prints it, then exits with